@@ -1,5 +1,7 @@
+from functools import lru_cache
+from pydantic import PrivateAttr
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, FrozenSet, List, Tuple
 
 class Settings(BaseSettings):
     # Azure Communication Services
@@ -14,9 +16,16 @@ class Settings(BaseSettings):
     otp_expiry_minutes: int = 10
     otp_max_attempts: int = 3
     otp_rate_limit_minutes: int = 1
+    # Scan-and-sort lookup for OTP rows saved before RowKeys were time-ordered.
+    # Only needed while such rows (valid for otp_expiry_minutes) may still exist.
+    otp_legacy_row_key_scan: bool = False
 
     # Session Configuration
     session_expiry_days: int = 30
+    # Fall back to a cross-partition scan for sessions stored under the email
+    # partition (before the fixed "session" partition). Disable once those rows
+    # are migrated (StorageService.migrate_legacy_sessions) or have expired.
+    session_legacy_lookup: bool = True
 
     # CORS
     allowed_origins: str = "*"
@@ -36,29 +45,40 @@ class Settings(BaseSettings):
     azure_gpt_deployment: str = "gpt-5"
     azure_gpt_api_version: str = "2025-01-01-preview"
 
+    # Max concurrent Azure OpenAI requests per process (Whisper + GPT)
+    azure_openai_max_concurrency: int = 8
+
     # LLM Access Control - comma-separated list of allowed emails
     llm_allowed_emails: str = ""
 
     class Config:
         env_file = ".env"
 
+    # Parsed once in model_post_init; Settings is loaded once per process
+    _allowed_origins: Tuple[str, ...] = PrivateAttr(default=())
+    _llm_allowed_emails: FrozenSet[str] = PrivateAttr(default=frozenset())
+
+    def model_post_init(self, __context: Any) -> None:
+        self._allowed_origins = tuple(origin.strip() for origin in self.allowed_origins.split(","))
+        self._llm_allowed_emails = frozenset(
+            email.strip().lower() for email in self.llm_allowed_emails.split(",") if email.strip()
+        )
+
     @property
     def allowed_origins_list(self) -> List[str]:
-        return [origin.strip() for origin in self.allowed_origins.split(",")]
+        return list(self._allowed_origins)
 
     @property
     def llm_allowed_emails_list(self) -> List[str]:
         """Parse comma-separated email whitelist into a list."""
-        if not self.llm_allowed_emails:
-            return []
-        return [email.strip().lower() for email in self.llm_allowed_emails.split(",") if email.strip()]
+        return sorted(self._llm_allowed_emails)
 
     def is_email_allowed_for_llm(self, email: str) -> bool:
-        """Check if email is allowed to use LLM endpoints."""
-        allowed = self.llm_allowed_emails_list
-        if not allowed:
-            # If no whitelist configured, allow all authenticated users
-            return True
-        return email.lower() in allowed
-
-settings = Settings()
+        """Check if email is allowed to use LLM endpoints. Expects a lowercased email."""
+        # If no whitelist configured, allow all authenticated users
+        return not self._llm_allowed_emails or email in self._llm_allowed_emails
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load settings once per process; routers and services all read them through this."""
+    return Settings()
@@ -0,0 +1,26 @@
+"""
+Process-wide service singletons. The routers fetch them once at import and keep
+them in module globals; main.py closes the same instances on shutdown.
+"""
+from functools import lru_cache
+from app.services.azure_openai_service import AzureOpenAIService
+from app.services.email_service import EmailService
+from app.services.storage_service import StorageService
+
+
+@lru_cache(maxsize=1)
+def get_storage_service() -> StorageService:
+    """The process-wide StorageService (and its cached table clients)."""
+    return StorageService()
+
+
+@lru_cache(maxsize=1)
+def get_openai_service() -> AzureOpenAIService:
+    """The process-wide AzureOpenAIService (and its pooled HTTP client)."""
+    return AzureOpenAIService()
+
+
+@lru_cache(maxsize=1)
+def get_email_service() -> EmailService:
+    """The process-wide EmailService."""
+    return EmailService()
@@ -1,15 +1,59 @@
-from fastapi import FastAPI
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import settings
+from fastapi.responses import ORJSONResponse
+from app.config import get_settings
+from app.dependencies import get_openai_service, get_storage_service
 from app.routers import auth, llm
 
 app = FastAPI(
     title="Eloquence Auth API",
     description="Authentication and LLM proxy service for Eloquence",
-    version="1.1.0"
+    version="1.1.0",
+    default_response_class=ORJSONResponse,
 )
 
+# Logging: request handlers only enqueue records; a background thread does the I/O
+log_queue = queue.SimpleQueue()
+root_logger = logging.getLogger()
+log_handlers = root_logger.handlers or [logging.StreamHandler()]
+root_logger.handlers = [QueueHandler(log_queue)]
+root_logger.setLevel(logging.INFO)
+# httpx logs every request at INFO; the services already log one line per call
+logging.getLogger("httpx").setLevel(logging.WARNING)
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+
+@app.on_event("startup")
+async def start_log_listener():
+    log_listener.start()
+
+@app.on_event("shutdown")
+async def stop_log_listener():
+    log_listener.stop()
+
+@app.on_event("shutdown")
+async def close_service_clients():
+    await get_openai_service().aclose()
+    get_storage_service().close()
+
+# Reject oversized bodies from the Content-Length header before reading them
+# (largest legitimate request is a 10MB audio upload plus multipart overhead)
+MAX_REQUEST_BODY_BYTES = 11 * 1024 * 1024
+
+@app.middleware("http")
+async def limit_request_body_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BODY_BYTES:
+        return ORJSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": "Request body too large."},
+        )
+    return await call_next(request)
+
 # CORS configuration
+settings = get_settings()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins_list,
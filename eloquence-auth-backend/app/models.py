@@ -1,29 +1,59 @@
 from __future__ import annotations
-from pydantic import BaseModel, EmailStr, Field
+import re
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Literal, Optional
+
+# Cheap syntactic check for the auth hot path (no email-validator/IDNA work).
+# Domain labels exclude "." so failed matches cannot backtrack quadratically.
+EMAIL_MAX_LENGTH = 254
+_EMAIL_RE = re.compile(r"^[^@\s]{1,64}@[^@\s.]+(?:\.[^@\s.]+)*\.[^@\s.]{2,}$")
+
+def _normalize_email(value: str) -> str:
+    """Validate email shape and normalize to lowercase."""
+    value = value.strip().lower()
+    if not _EMAIL_RE.match(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
+# Length is checked by pydantic-core before the regex runs
+EmailAddress = Annotated[str, Field(max_length=EMAIL_MAX_LENGTH), AfterValidator(_normalize_email)]
+
+# Requests reject unknown fields; responses are immutable once built
+REQUEST_CONFIG = ConfigDict(extra="forbid", str_strip_whitespace=True)
+RESPONSE_CONFIG = ConfigDict(frozen=True)
 
 # Request Models
 class SendOTPRequest(BaseModel):
-    email: EmailStr
+    model_config = REQUEST_CONFIG
+
+    email: EmailAddress
 
 class VerifyOTPRequest(BaseModel):
-    email: EmailStr
+    model_config = REQUEST_CONFIG
+
+    email: EmailAddress
     code: str = Field(..., min_length=6, max_length=6, pattern="^[0-9]{6}$")
 
 # Response Models
 class SendOTPResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     success: bool
     message: str
     expiresIn: int  # seconds
 
 class UserResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     id: str
     email: str
     createdAt: str
     lastLoginAt: str
 
 class VerifyOTPResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     success: bool
     message: str
     user: Optional[UserResponse] = None
@@ -32,6 +62,8 @@ class VerifyOTPResponse(BaseModel):
 
 # Error Response
 class ErrorResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     error: str
     message: str
     code: int
@@ -40,17 +72,21 @@ class ErrorResponse(BaseModel):
 # LLM Proxy Models
 
 class TranscriptionResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     text: str
     duration: Optional[float] = None
     language: Optional[str] = None
 
 
 class GPTMessage(BaseModel):
-    role: str
+    role: Literal["system", "user", "assistant", "tool"]
     content: str
 
 
 class SpeechAnalysisRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
     transcription: str
     wordCount: int
     duration: float
@@ -62,6 +98,8 @@ class SpeechAnalysisRequest(BaseModel):
 
 
 class SpeechAnalysisResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     toneScore: int
     confidenceScore: int
     enthusiasmScore: int
@@ -76,6 +114,8 @@ class SpeechAnalysisResponse(BaseModel):
 
 
 class GestureAnalysisRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
     transcription: str
     smileFrequency: float
     expressionVariety: float
@@ -90,6 +130,8 @@ class GestureAnalysisRequest(BaseModel):
 
 
 class GestureAnalysisResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     gestureFeedback: str
     gestureStrength: str
     gestureImprovement: str
@@ -97,6 +139,8 @@ class GestureAnalysisResponse(BaseModel):
 
 
 class KeyFrameAnnotationRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
     imageBase64: str
     frameType: str  # bestFacial, bestOverall, improveFacial, etc.
     transcriptionExcerpt: str
@@ -105,4 +149,28 @@ class KeyFrameAnnotationRequest(BaseModel):
 
 
 class KeyFrameAnnotationResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
     annotation: str
+
+
+class KeyFrameBatchItem(BaseModel):
+    model_config = REQUEST_CONFIG
+
+    imageBase64: str
+    frameType: str  # bestFacial, bestOverall, improveFacial, etc.
+    transcriptionExcerpt: str
+    timestamp: float
+
+
+class KeyFrameBatchAnnotationRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
+    frames: list[KeyFrameBatchItem] = Field(..., min_length=1, max_length=10)
+    voiceStyle: Optional[str] = "Neutral"  # Neutral, Motivational, Analytical
+
+
+class KeyFrameBatchAnnotationResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+
+    annotations: list[str]  # same order as request frames
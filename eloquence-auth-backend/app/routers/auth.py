@@ -1,21 +1,61 @@
 from fastapi import APIRouter, HTTPException, status
-from datetime import datetime
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
 from app.models import (
     SendOTPRequest, SendOTPResponse,
     VerifyOTPRequest, VerifyOTPResponse, UserResponse,
     ErrorResponse
 )
 from app.services.otp_service import OTPService
-from app.services.email_service import EmailService
-from app.services.storage_service import StorageService
-from app.config import settings
+from app.config import get_settings
+from app.dependencies import get_email_service, get_storage_service
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-# Initialize services
+# Initialize services (shared per process with the other routers)
 otp_service = OTPService()
-email_service = EmailService()
-storage_service = StorageService()
+email_service = get_email_service()
+storage_service = get_storage_service()
+
+# Fixed for the process lifetime; returned as-is in responses
+OTP_EXPIRY_SECONDS = get_settings().otp_expiry_minutes * 60
+SESSION_EXPIRY_SECONDS = get_settings().session_expiry_days * 86400
+OTP_RATE_LIMIT_SECONDS = get_settings().otp_rate_limit_minutes * 60
+
+# Per-worker cache of recent sends, checked before storage (which stays the
+# source of truth across workers and restarts). Insertion order == send order,
+# so expired entries are always at the front of the dict.
+_recent_sends: Dict[str, float] = {}
+
+# Per-email send locks, with the number of requests holding or waiting on each.
+# A lock only exists while some request for that email is in flight.
+_send_locks: Dict[str, asyncio.Lock] = {}
+_send_lock_users: Dict[str, int] = {}
+
+def _evict_recent_sends(now: float):
+    """Drop rate-limit entries older than the window."""
+    cutoff = now - OTP_RATE_LIMIT_SECONDS
+    while _recent_sends:
+        email, sent_at = next(iter(_recent_sends.items()))
+        if sent_at >= cutoff:
+            break
+        del _recent_sends[email]
+
+@asynccontextmanager
+async def _email_send_lock(email: str):
+    """Serialize sends per email; the lock is removed when its last user leaves, even on errors."""
+    lock = _send_locks.setdefault(email, asyncio.Lock())
+    _send_lock_users[email] = _send_lock_users.get(email, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _send_lock_users[email] -= 1
+        if not _send_lock_users[email]:
+            del _send_lock_users[email]
+            del _send_locks[email]
 
 @router.post("/send-otp", response_model=SendOTPResponse)
 async def send_otp(request: SendOTPRequest):
@@ -24,28 +64,37 @@ async def send_otp(request: SendOTPRequest):
     Similar to Supabase's signInWithOTP endpoint.
     """
 
-    # Check rate limiting
-    latest_otp = storage_service.get_latest_otp(request.email)
-    if latest_otp:
-        created_at = datetime.fromisoformat(latest_otp.get('createdAt'))
-        if otp_service.is_rate_limited(created_at):
+    # Serialize sends per email so concurrent requests can't both pass the check
+    async with _email_send_lock(request.email):
+        # Check rate limiting: this worker's recent sends first, then the newest stored OTP
+        now = time.time()
+        _evict_recent_sends(now)
+        rate_limited = request.email in _recent_sends
+        if not rate_limited:
+            latest_otp = storage_service.get_latest_otp(request.email)
+            rate_limited = (
+                latest_otp is not None
+                and storage_service.get_created_epoch(latest_otp) > now - OTP_RATE_LIMIT_SECONDS
+            )
+        if rate_limited:
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Too many requests. Please wait before requesting a new code."
             )
 
-    # Clean up old OTPs for this email
-    storage_service.delete_old_otps(request.email)
-
-    # Generate OTP
-    code = otp_service.generate_otp()
-    expires_at = otp_service.calculate_expiry()
+        # Generate OTP
+        code = otp_service.generate_otp()
+        expires_at = otp_service.calculate_expiry()
 
-    # Save OTP to storage
-    storage_service.save_otp(request.email, code, expires_at)
+        # Save OTP to storage
+        row_key = storage_service.save_otp(request.email, code, expires_at)
+        _recent_sends[request.email] = time.time()
 
-    # Send email
-    email_sent = email_service.send_otp_email(request.email, code)
+        # Clean up old OTPs for this email while the email is being sent
+        _, email_sent = await asyncio.gather(
+            asyncio.to_thread(storage_service.delete_old_otps, request.email, row_key),
+            email_service.send_otp_email(request.email, code),
+        )
 
     if not email_sent:
         raise HTTPException(
@@ -56,7 +105,7 @@ async def send_otp(request: SendOTPRequest):
     return SendOTPResponse(
         success=True,
         message=f"OTP sent to {request.email}",
-        expiresIn=settings.otp_expiry_minutes * 60
+        expiresIn=OTP_EXPIRY_SECONDS
     )
 
 @router.post("/verify-otp", response_model=VerifyOTPResponse)
@@ -72,12 +121,11 @@ async def verify_otp(request: VerifyOTPRequest):
     if not otp_record:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No OTP found for this email. Please request a new code."
+            detail="No valid OTP found for this email. It may have expired. Please request a new code."
         )
 
     # Check if OTP is expired
-    expires_at = datetime.fromisoformat(otp_record.get('expiresAt'))
-    if otp_service.is_expired(expires_at):
+    if otp_service.is_expired(storage_service.get_expiry_epoch(otp_record)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="OTP code has expired. Please request a new code."
@@ -85,14 +133,17 @@ async def verify_otp(request: VerifyOTPRequest):
 
     # Check max attempts
     attempts = otp_record.get('attempts', 0)
-    if attempts >= settings.otp_max_attempts:
+    if attempts >= get_settings().otp_max_attempts:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Too many failed attempts. Please request a new code."
         )
 
-    # Verify code
-    if otp_record.get('code') != request.code:
+    # Verify code (numeric compare; brute force is bounded by otp_max_attempts)
+    stored_code = otp_record.get('codeInt')
+    if stored_code is None:  # rows saved before codeInt was added
+        stored_code = int(otp_record.get('code', -1))
+    if stored_code != int(request.code):
         # Increment attempt counter
         storage_service.increment_otp_attempts(request.email, otp_record['RowKey'])
 
@@ -117,14 +168,12 @@ async def verify_otp(request: VerifyOTPRequest):
         lastLoginAt=session['lastAccessedAt']
     )
 
-    expires_in_seconds = int((session_expires - datetime.utcnow()).total_seconds())
-
     return VerifyOTPResponse(
         success=True,
         message="Login successful",
         user=user,
         accessToken=session_token,
-        expiresIn=expires_in_seconds
+        expiresIn=SESSION_EXPIRY_SECONDS
     )
 
 @router.get("/health")
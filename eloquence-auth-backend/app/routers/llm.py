@@ -1,26 +1,68 @@
 """
 LLM Proxy Router - Proxies Azure OpenAI API calls with authentication and email whitelist.
 """
+import hashlib
 import logging
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, status, Header, UploadFile, File
+import secrets
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+from fastapi import APIRouter, HTTPException, status, Header, UploadFile, File, Form
 from app.models import (
     TranscriptionResponse,
     SpeechAnalysisRequest, SpeechAnalysisResponse,
     GestureAnalysisRequest, GestureAnalysisResponse,
     KeyFrameAnnotationRequest, KeyFrameAnnotationResponse,
+    KeyFrameBatchAnnotationRequest, KeyFrameBatchAnnotationResponse,
 )
-from app.services.storage_service import StorageService
-from app.services.azure_openai_service import AzureOpenAIService
-from app.config import settings
+from app.config import get_settings
+from app.dependencies import get_openai_service, get_storage_service
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/llm", tags=["LLM Proxy"])
 
-# Initialize services
-storage_service = StorageService()
-openai_service = AzureOpenAIService()
+# Initialize services (shared per process with the other routers)
+storage_service = get_storage_service()
+openai_service = get_openai_service()
+
+# Short-lived cache of validated sessions so the burst of calls made per
+# recording (transcribe, analyze, annotate) hits Table Storage only once.
+# Keyed by a keyed digest of the token so raw bearer tokens are not kept in memory.
+SESSION_CACHE_MAX_ENTRIES = 1024
+SESSION_CACHE_TTL_SECONDS = 60.0
+_SESSION_CACHE_PEPPER = secrets.token_bytes(32)  # per-process; cache is never shared
+_session_cache: "OrderedDict[bytes, Tuple[dict, int, float]]" = OrderedDict()
+
+
+def _session_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16, key=_SESSION_CACHE_PEPPER).digest()
+
+
+def _get_cached_session(key: bytes) -> Optional[Tuple[dict, int]]:
+    entry = _session_cache.get(key)
+    if entry is None:
+        return None
+    session, expires_at, cached_until = entry
+    if cached_until < time.monotonic():
+        del _session_cache[key]
+        return None
+    _session_cache.move_to_end(key)
+    return session, expires_at
+
+
+def _cache_session(key: bytes, session: dict, expires_at: int) -> None:
+    _session_cache[key] = (session, expires_at, time.monotonic() + SESSION_CACHE_TTL_SECONDS)
+    _session_cache.move_to_end(key)
+    if len(_session_cache) > SESSION_CACHE_MAX_ENTRIES:
+        _session_cache.popitem(last=False)
+
+
+@lru_cache(maxsize=256)
+def _email_allowed(email: str) -> bool:
+    """Memoized whitelist check. Call _email_allowed.cache_clear() if settings are reloaded."""
+    return get_settings().is_email_allowed_for_llm(email)
 
 
 async def validate_session_and_whitelist(authorization: str) -> dict:
@@ -44,25 +86,32 @@ async def validate_session_and_whitelist(authorization: str) -> dict:
 
     token = authorization[7:]  # Remove "Bearer " prefix
 
-    # Validate session
-    session = storage_service.get_session(token)
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired session token.",
-        )
+    cache_key = _session_cache_key(token)
+    cached = _get_cached_session(cache_key)
+    if cached:
+        session, expires_at = cached
+    else:
+        # Validate session
+        session = storage_service.get_session(token)
+        if not session:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired session token.",
+            )
+        expires_at = storage_service.get_expiry_epoch(session)
+        _cache_session(cache_key, session, expires_at)
 
     # Check expiration
-    expires_at = datetime.fromisoformat(session.get("expiresAt"))
-    if expires_at < datetime.utcnow():
+    if expires_at < time.time():
+        _session_cache.pop(cache_key, None)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Session has expired. Please log in again.",
         )
 
     # Check email whitelist
-    email = session.get("PartitionKey", "")  # Email is stored as PartitionKey
-    if not settings.is_email_allowed_for_llm(email):
+    email = session.get("email", "")
+    if not _email_allowed(email):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Your account is not authorized to use LLM features.",
@@ -71,6 +120,11 @@ async def validate_session_and_whitelist(authorization: str) -> dict:
     return session
 
 
+MAX_AUDIO_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_BASE64_CHARS = 300 * 1024
+MAX_IMAGE_BYTES = MAX_IMAGE_BASE64_CHARS * 3 // 4  # same limit as the base64 endpoint
+
+
 @router.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(
     file: UploadFile = File(...),
@@ -82,34 +136,29 @@ async def transcribe_audio(
     Expects multipart form data with audio file.
     Requires valid session token and whitelisted email.
     """
-    logger.info(f"[Router] /transcribe - filename: {file.filename}")
+    logger.debug("[Router] /transcribe - filename: %s", file.filename)
     await validate_session_and_whitelist(authorization)
 
-    # Read file content
-    audio_data = await file.read()
-    logger.info(f"[Router] /transcribe - received {len(audio_data)} bytes")
+    # The multipart parser has already spooled the upload; limit file size to 10MB
+    audio_size = file.size or 0
+    logger.debug("[Router] /transcribe - received %d bytes", audio_size)
 
-    if len(audio_data) == 0:
-        logger.warning("[Router] /transcribe - empty file rejected")
+    if audio_size > MAX_AUDIO_BYTES:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Empty audio file.",
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Audio file too large. Maximum size is 10MB.",
         )
 
-    # Limit file size (10MB)
-    if len(audio_data) > 10 * 1024 * 1024:
-        logger.warning(f"[Router] /transcribe - file too large: {len(audio_data)} bytes")
+    if audio_size == 0:
+        logger.warning("[Router] /transcribe - empty file rejected")
         raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="Audio file too large. Maximum size is 10MB.",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Empty audio file.",
         )
 
     try:
-        logger.info("[Router] /transcribe - calling Azure OpenAI...")
-        result = await openai_service.transcribe_audio(
-            audio_data=audio_data,
-            filename=file.filename or "audio.m4a",
-        )
+        logger.debug("[Router] /transcribe - calling Azure OpenAI...")
+        result = await openai_service.transcribe_audio_streaming(file)
 
         # Validate transcription is not empty
         text = result.get("text", "").strip()
@@ -120,7 +169,7 @@ async def transcribe_audio(
                 detail="Transcription returned empty. Audio may be silent or unclear.",
             )
 
-        logger.info(f"[Router] /transcribe - success, {len(text)} chars")
+        logger.debug("[Router] /transcribe - success, %d chars", len(text))
         return TranscriptionResponse(
             text=text,
             duration=result.get("duration"),
@@ -130,7 +179,7 @@ async def transcribe_audio(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[Router] /transcribe - FAILED: {type(e).__name__}: {e}")
+        logger.error("[Router] /transcribe - FAILED: %s: %s", type(e).__name__, e)
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Azure OpenAI API error: {str(e)}",
@@ -178,7 +227,7 @@ async def analyze_speech(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Speech analysis error: {e}")
+        logger.exception("[Router] /analyze-speech - FAILED")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Azure OpenAI API error: {str(e)}",
@@ -222,7 +271,37 @@ async def analyze_gesture(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Gesture analysis error: {e}")
+        logger.exception("[Router] /analyze-gesture - FAILED")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Azure OpenAI API error: {str(e)}",
+        )
+
+
+async def _annotate_key_frame(
+    image_base64: Optional[str],
+    frame_type: str,
+    transcription_excerpt: str,
+    timestamp: float,
+    voice_style: Optional[str],
+    image_bytes: Optional[bytes] = None,
+) -> KeyFrameAnnotationResponse:
+    try:
+        annotation = await openai_service.annotate_key_frame(
+            image_base64=image_base64,
+            image_bytes=image_bytes,
+            frame_type=frame_type,
+            transcription_excerpt=transcription_excerpt,
+            timestamp=timestamp,
+            voice_style=voice_style or "Neutral",
+        )
+
+        return KeyFrameAnnotationResponse(annotation=annotation)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("[Router] /annotate-frame - FAILED")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Azure OpenAI API error: {str(e)}",
@@ -242,27 +321,104 @@ async def annotate_key_frame(
     await validate_session_and_whitelist(authorization)
 
     # Validate base64 image size (roughly 200KB limit for base64)
-    if len(request.imageBase64) > 300 * 1024:
+    if len(request.imageBase64) > MAX_IMAGE_BASE64_CHARS:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             detail="Image too large. Maximum size is ~200KB.",
         )
 
+    return await _annotate_key_frame(
+        image_base64=request.imageBase64,
+        frame_type=request.frameType,
+        transcription_excerpt=request.transcriptionExcerpt,
+        timestamp=request.timestamp,
+        voice_style=request.voiceStyle,
+    )
+
+
+@router.post("/annotate-frame-upload", response_model=KeyFrameAnnotationResponse)
+async def annotate_key_frame_upload(
+    image: UploadFile = File(...),
+    frameType: str = Form(...),
+    transcriptionExcerpt: str = Form(...),
+    timestamp: float = Form(...),
+    voiceStyle: Optional[str] = Form("Neutral"),
+    authorization: str = Header(...),
+):
+    """
+    Generate key frame annotation from a raw JPEG upload.
+
+    Same as /annotate-frame, but takes the image as multipart form data
+    instead of JSON-embedded base64 (~25% smaller request body).
+    Requires valid session token and whitelisted email.
+    """
+    await validate_session_and_whitelist(authorization)
+
+    # The multipart parser has already spooled the upload; check its size before reading it
+    image_size = image.size or 0
+    if image_size > MAX_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Image too large. Maximum size is ~200KB.",
+        )
+
+    if image_size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Empty image file.",
+        )
+
+    image_bytes = await image.read()
+
+    return await _annotate_key_frame(
+        image_base64=None,
+        image_bytes=image_bytes,
+        frame_type=frameType,
+        transcription_excerpt=transcriptionExcerpt,
+        timestamp=timestamp,
+        voice_style=voiceStyle,
+    )
+
+
+@router.post("/annotate-frames", response_model=KeyFrameBatchAnnotationResponse)
+async def annotate_key_frames_batch(
+    request: KeyFrameBatchAnnotationRequest,
+    authorization: str = Header(...),
+):
+    """
+    Generate annotations for several key frames in one Azure GPT Vision call.
+
+    Saves one round-trip per additional frame compared to /annotate-frame.
+    Requires valid session token and whitelisted email.
+    """
+    await validate_session_and_whitelist(authorization)
+
+    if any(len(frame.imageBase64) > MAX_IMAGE_BASE64_CHARS for frame in request.frames):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Image too large. Maximum size is ~200KB per frame.",
+        )
+
     try:
-        annotation = await openai_service.annotate_key_frame(
-            image_base64=request.imageBase64,
-            frame_type=request.frameType,
-            transcription_excerpt=request.transcriptionExcerpt,
-            timestamp=request.timestamp,
+        annotations = await openai_service.annotate_key_frames_batch(
+            frames=[
+                {
+                    "image_base64": frame.imageBase64,
+                    "frame_type": frame.frameType,
+                    "transcription_excerpt": frame.transcriptionExcerpt,
+                    "timestamp": frame.timestamp,
+                }
+                for frame in request.frames
+            ],
             voice_style=request.voiceStyle or "Neutral",
         )
 
-        return KeyFrameAnnotationResponse(annotation=annotation)
+        return KeyFrameBatchAnnotationResponse(annotations=annotations)
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Frame annotation error: {e}")
+        logger.exception("[Router] /annotate-frames - FAILED")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Azure OpenAI API error: {str(e)}",
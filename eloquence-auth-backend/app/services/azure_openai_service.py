@@ -2,46 +2,296 @@
 Azure OpenAI Service - Handles all Azure OpenAI API calls.
 """
 import httpx
+import asyncio
 import base64
+import functools
 import logging
-from typing import Optional
-from app.config import settings
+import os
+import re
+import secrets
+import time
+import orjson
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional
+from fastapi import UploadFile
+from app.config import get_settings
 
-# Configure logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
-
-class AzureOpenAIService:
-    """Service for Azure OpenAI API interactions (Whisper + GPT)."""
-
-    def _get_voice_style_instruction(self, voice_style: str) -> str:
-        """Get coaching style instruction based on voice style setting."""
-        if voice_style == "Motivational":
-            return """
+# Per-call timeouts. The iOS client gives up after the same time (60s; 30s for
+# /annotate-frame), so a call and all its retries must finish a little earlier.
+REQUEST_TIMEOUT_SECONDS = 60.0
+CONNECT_TIMEOUT_SECONDS = 5.0
+_DEADLINE_MARGIN_SECONDS = 5.0
+
+# Failures that come back quickly and are worth retrying: connection errors
+# and rate limiting / server-side errors. Read timeouts are not retried.
+_RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+_RETRY_ATTEMPTS = 4
+# A retry is only started if at least this much of the deadline is left
+_RETRY_MIN_ATTEMPT_SECONDS = 5.0
+_retry_backoff = wait_exponential_jitter(initial=1, max=16)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Connection errors and 429/5xx responses are retried."""
+    if isinstance(exc, _RETRY_EXCEPTIONS):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in _RETRY_STATUS_CODES
+
+
+def _retry_after_seconds(retry_state: RetryCallState) -> Optional[float]:
+    """Numeric Retry-After header of the failed attempt, if any."""
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, httpx.HTTPStatusError):
+        retry_after = exc.response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass  # HTTP-date form; use the regular backoff
+    return None
+
+
+def _retry_budget(deadline: float) -> float:
+    """Seconds that may be spent waiting before the next attempt."""
+    return deadline - time.monotonic() - _RETRY_MIN_ATTEMPT_SECONDS
+
+
+def _stop_at_deadline(deadline: float, retry_state: RetryCallState) -> bool:
+    """Stop when no attempt fits before the deadline, or Retry-After asks for longer than is left."""
+    budget = _retry_budget(deadline)
+    retry_after = _retry_after_seconds(retry_state)
+    return budget <= 0 or (retry_after is not None and retry_after > budget)
+
+
+def _retry_wait(deadline: float, retry_state: RetryCallState) -> float:
+    """Honour a numeric Retry-After header, otherwise back off exponentially with jitter."""
+    retry_after = _retry_after_seconds(retry_state)
+    wait = retry_after if retry_after is not None else _retry_backoff(retry_state)
+    return max(0.0, min(wait, _retry_budget(deadline)))
+
+
+def _log_retry(name: str, retry_state: RetryCallState) -> None:
+    exc = retry_state.outcome.exception()
+    reason = exc.response.status_code if isinstance(exc, httpx.HTTPStatusError) else type(exc).__name__
+    logger.warning(
+        "[%s] Attempt %d failed (%s), retrying in %.1fs",
+        name,
+        retry_state.attempt_number,
+        reason,
+        retry_state.next_action.sleep,
+    )
+
+
+_VOICE_STYLES = {
+    "Motivational": """
 Coaching Style: MOTIVATIONAL
 - Use encouraging, energetic language
 - Celebrate strengths enthusiastically
 - Frame improvements as exciting opportunities
 - Use phrases like "Great job!", "You're on the right track!", "Keep pushing!"
-"""
-        elif voice_style == "Analytical":
-            return """
+""",
+    "Analytical": """
 Coaching Style: ANALYTICAL
 - Use precise, data-driven language
 - Focus on metrics and measurable observations
 - Provide structured, logical feedback
 - Avoid emotional language, be objective and clinical
-"""
-        else:  # Neutral
-            return """
+""",
+    "Neutral": """
 Coaching Style: NEUTRAL
 - Use balanced, professional language
 - Mix encouragement with constructive criticism
 - Be direct but supportive
+""",
+}
+
+# System prompts are fully static so Azure OpenAI prompt caching can reuse the
+# prefix across calls; per-request context (coaching style, detected signals,
+# metrics) goes in the user message.
+_SPEECH_SYSTEM_PROMPT = """You are an expert presentation coach analyzing a practice presentation. Provide detailed, personalized coaching feedback that references specific moments from the transcription.
+
+Follow the coaching style preference given in the user message.
+
+Scoring Guidelines:
+- Tone Score (0-100): Overall vocal quality, appropriateness for context
+- Confidence Score (0-100): Assertiveness, clarity, conviction in speech
+- Enthusiasm Score (0-100): Energy, passion, engagement with topic
+- Clarity Score (0-100): Articulation, organization, ease of understanding
+
+Pacing Guidelines:
+- Ideal: 130-150 words per minute (clear, comfortable pace)
+- Acceptable: 100-130 or 150-180 WPM (slightly slow or fast)
+- Poor: Below 100 or above 180 WPM (too slow or rushed)
+
+Feedback Quality Guidelines:
+- Reference specific moments and quotes from the transcription
+- Balance strengths and growth areas with concrete examples
+- Provide actionable advice, not generic observations
+- Match your tone to the presentation's formality and topic
+- Use as much detail as needed to be genuinely helpful (2-8 sentences is fine)
+
+Example of excellent feedback:
+"Your opening about climate change showed strong conviction, especially when you emphasized the 2050 deadline at the start. Your pace was ideal (145 WPM) - fast enough to show energy but not rushed. The transition where you said 'but here's what we can do' was perfectly timed and confident. Consider varying your vocal tone more when transitioning between hard statistics and human impact stories to create more emotional contrast and keep your audience engaged. Your conclusion would also benefit from a slight pause before the final call-to-action to let the weight settle."
+
+Respond ONLY with valid JSON matching this exact structure (no additional text):
+{
+  "toneScore": <number 0-100>,
+  "confidenceScore": <number 0-100>,
+  "enthusiasmScore": <number 0-100>,
+  "clarityScore": <number 0-100>,
+  "feedback": "<detailed, personalized coaching feedback>",
+  "keyStrengths": ["<specific strength with example>", "<specific strength with example>"],
+  "areasToImprove": ["<specific area with actionable advice>", "<specific area with actionable advice>"],
+  "toneStrength": "<specific strength about vocal tone with example from the speech>",
+  "toneImprovement": "<specific actionable improvement for vocal tone>",
+  "pacingStrength": "<specific strength about pacing/rhythm, reference the WPM if relevant>",
+  "pacingImprovement": "<specific actionable improvement for pacing>"
+}"""
+
+_GESTURE_SYSTEM_PROMPT = """You are an expert presentation coach analyzing body language and non-verbal communication. Based on the gesture metrics and presentation content provided, evaluate the detected signals listed in the user message and provide detailed, contextual coaching feedback.
+
+Follow the coaching style preference given in the user message.
+
+IMPORTANT: Only provide feedback about the metrics that were detected. Do not mention facial expressions if no facial data is available, do not mention posture if no posture data is available, and do not mention eye contact if no eye contact data is available.
+
+Feedback Quality Guidelines:
+- Connect body language observations to specific moments in the presentation
+- Reference the presentation content to make feedback contextual
+- Provide actionable advice with concrete examples
+- Match your tone to the presentation's formality and topic
+- Be specific and helpful, not generic (use as much detail as needed)
+
+Respond ONLY with valid JSON matching this exact structure (no additional text):
+{
+  "gestureFeedback": "<detailed, contextual coaching feedback about detected body language>",
+  "gestureStrength": "<specific strength with example from the presentation>",
+  "gestureImprovement": "<specific improvement area with actionable advice>"
+}"""
+
+_FACIAL_TMPL = """FACIAL EXPRESSION METRICS:
+- Smile frequency: {:.1f}%
+- Expression variety: {:.1f}%
+- Engagement level: {:.1f}%
+"""
+_POSTURE_TMPL = """BODY POSTURE METRICS:
+- Posture confidence: {:.1f}%
+- Movement consistency: {:.1f}%
+- Stability: {:.1f}%
 """
+_EYE_CONTACT_TMPL = """EYE CONTACT METRICS:
+- Camera focus: {:.1f}%
+- Time reading notes (looking down): {:.1f}%
+- Gaze stability: {:.1f}%
+"""
+_READING_NOTES_NOTE = "NOTE: The speaker frequently looked down, likely reading notes. Address this in the feedback."
+
+_VISION_GUIDELINES = """Follow the coaching style preference given in the user message.
+
+Guidelines:
+- Adapt tone to presentation formality (academic = professional, casual = friendly)
+- Reference specific visual details (posture, expression, gaze)
+- Connect to transcription context when relevant
+- Be specific and actionable, not generic
+- For "best" frames: highlight what's working well
+- For "improve" frames: suggest specific improvements"""
+
+_VISION_SYSTEM_PROMPT = """You are an expert presentation coach analyzing a specific moment from a presentation. Based on the frame image and transcription context, provide one concise, specific coaching comment (20-40 words).
+
+""" + _VISION_GUIDELINES
+
+_VISION_BATCH_SYSTEM_PROMPT = """You are an expert presentation coach analyzing several moments from a presentation. For each frame image, using its own transcription context, provide one concise, specific coaching comment (20-40 words), and return all comments together as the JSON object requested in the user message.
+
+""" + _VISION_GUIDELINES
+
+_FRAME_TYPE_GUIDANCE = {
+    "bestFacial": "This is a STRENGTH moment for facial expression. Highlight what's working well (eye contact, smile, engagement, etc.).",
+    "bestOverall": "This is a STRENGTH moment overall. Highlight the combination of good expression, posture, and engagement.",
+    "improveFacial": "This is an IMPROVEMENT AREA for facial expression. Suggest specific ways to improve engagement, eye contact, or expressiveness.",
+    "improvePosture": "This is an IMPROVEMENT AREA for posture. Suggest specific ways to improve body position, confidence, or stability.",
+    "improveEyeContact": "This is an IMPROVEMENT AREA for eye contact. Suggest ways to improve camera focus or gaze consistency.",
+    "averageMoment": "This is a REPRESENTATIVE moment. Provide neutral, balanced observation.",
+}
+_DEFAULT_FRAME_GUIDANCE = "Provide a balanced observation."
+
+_CONTENT_TYPES = {"wav": "audio/wav", "mp3": "audio/mpeg", "m4a": "audio/m4a"}
+_DEFAULT_CONTENT_TYPE = "audio/m4a"
+
+# Outermost {...} in a reply that wraps its JSON in prose
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+
+def _parse_json_reply(content: str) -> dict:
+    """Parse a model's JSON reply, tolerating ```json fences and surrounding prose."""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`").strip()
+        content = content.removeprefix("json").strip()
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        match = _JSON_OBJECT_RE.search(content)
+        if match is None:
+            raise
+        return orjson.loads(match.group(0))
+
+
+# Read size when streaming an upload to Whisper
+STREAM_CHUNK_BYTES = 256 * 1024
+
+
+class _UploadChunks:
+    """Async iterable over an upload's bytes; every iteration starts from the beginning."""
+
+    def __init__(self, upload: UploadFile, chunk_size: int = STREAM_CHUNK_BYTES):
+        self._upload = upload
+        self._chunk_size = chunk_size
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        await self._upload.seek(0)
+        while chunk := await self._upload.read(self._chunk_size):
+            yield chunk
+
+
+class _MultipartAudioBody:
+    """Multipart body wrapped around an audio stream; re-iterable if the stream is."""
+
+    def __init__(self, head: bytes, stream: AsyncIterable[bytes], tail: bytes):
+        self._head = head
+        self._stream = stream
+        self._tail = tail
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self._head
+        async for chunk in self._stream:
+            yield chunk
+        yield self._tail
+
+
+class AzureOpenAIService:
+    """
+    Service for Azure OpenAI API interactions (Whisper + GPT).
+
+    One instance is shared per process and is safe to call concurrently
+    (e.g. analyze_speech, analyze_gesture and annotate_key_frame via
+    asyncio.gather): all calls share one pooled HTTP client, and at most
+    azure_openai_max_concurrency requests are in flight at once.
+    """
+
+    def _get_voice_style_instruction(self, voice_style: str) -> str:
+        """Get coaching style instruction based on voice style setting."""
+        return _VOICE_STYLES.get(voice_style, _VOICE_STYLES["Neutral"])
 
     def __init__(self):
+        settings = get_settings()
         # Whisper config (separate resource)
         self.whisper_endpoint = settings.azure_whisper_endpoint.rstrip("/")
         self.whisper_api_key = settings.azure_whisper_api_key
@@ -64,67 +314,194 @@ Coaching Style: NEUTRAL
         logger.info(f"[GPT] API Key: {masked_gpt_key}")
         logger.info(f"[GPT] Deployment: {self.gpt_deployment} (v{self.gpt_api_version})")
 
-    def _whisper_url(self) -> str:
-        return f"{self.whisper_endpoint}/openai/deployments/{self.whisper_deployment}/audio/transcriptions?api-version={self.whisper_api_version}"
+        # Request URLs never change after init
+        self.whisper_url = f"{self.whisper_endpoint}/openai/deployments/{self.whisper_deployment}/audio/transcriptions?api-version={self.whisper_api_version}"
+        self.gpt_url = f"{self.gpt_endpoint}/openai/deployments/{self.gpt_deployment}/chat/completions?api-version={self.gpt_api_version}"
 
-    def _gpt_url(self) -> str:
-        return f"{self.gpt_endpoint}/openai/deployments/{self.gpt_deployment}/chat/completions?api-version={self.gpt_api_version}"
+        # Static request headers, shared by every call (httpx copies them per request)
+        self._whisper_headers = {"api-key": self.whisper_api_key}
+        self._gpt_headers = {"api-key": self.gpt_api_key, "Content-Type": "application/json"}
 
-    async def transcribe_audio(self, audio_data: bytes, filename: str = "audio.m4a") -> dict:
-        """
-        Transcribe audio using Azure Whisper API.
+        # Bounds in-flight Azure OpenAI requests to stay within TPM/RPM quotas
+        self._request_slots = asyncio.Semaphore(settings.azure_openai_max_concurrency)
 
-        Args:
-            audio_data: Raw audio file bytes
-            filename: Original filename for content-type detection
+        # Shared client: keeps TLS connections to both Azure resources alive across calls
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30),
+        )
 
-        Returns:
-            dict with text, duration, language
-        """
-        url = self._whisper_url()
-        logger.info(f"[Whisper] Request URL: {url}")
-        logger.info(f"[Whisper] Audio size: {len(audio_data)} bytes, filename: {filename}")
-
-        # Determine content type from filename
-        content_type = "audio/m4a"
-        if filename.endswith(".wav"):
-            content_type = "audio/wav"
-        elif filename.endswith(".mp3"):
-            content_type = "audio/mpeg"
-        logger.info(f"[Whisper] Content-Type: {content_type}")
-
-        files = {
-            "file": (filename, audio_data, content_type),
-            "model": (None, "whisper-1"),
-        }
+    async def aclose(self):
+        """Close the shared HTTP client. Call on application shutdown."""
+        await self._client.aclose()
 
-        try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                logger.info(f"[Whisper] Sending request...")
-                response = await client.post(
-                    url,
-                    headers={"api-key": self.whisper_api_key},
-                    files=files,
-                )
-                logger.info(f"[Whisper] Response status: {response.status_code}")
-
-                if response.status_code != 200:
-                    logger.error(f"[Whisper] Error response body: {response.text}")
+    async def _post(
+        self,
+        name: str,
+        url: str,
+        *,
+        retry: bool = True,
+        timeout: float = REQUEST_TIMEOUT_SECONDS,
+        **request_kwargs,
+    ) -> httpx.Response:
+        """
+        POST under the concurrency limit and raise for non-2xx responses.
+
+        The call, including every retry and backoff, ends within timeout minus
+        _DEADLINE_MARGIN_SECONDS, before the client calling us gives up.
+        Connection errors and 429/5xx responses are retried up to
+        _RETRY_ATTEMPTS times (honouring Retry-After) while the deadline allows;
+        read timeouts are not. The concurrency slot is released while waiting
+        between attempts. Pass retry=False for bodies that cannot be replayed
+        (e.g. async streams).
+        """
+        deadline = time.monotonic() + timeout - _DEADLINE_MARGIN_SECONDS
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(_RETRY_ATTEMPTS if retry else 1)
+            | functools.partial(_stop_at_deadline, deadline),
+            wait=functools.partial(_retry_wait, deadline),
+            retry=retry_if_exception(_is_retryable),
+            before_sleep=functools.partial(_log_retry, name),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                try:
+                    await asyncio.wait_for(self._request_slots.acquire(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    raise httpx.PoolTimeout("No request slot became free before the deadline") from None
+                try:
+                    remaining = max(deadline - time.monotonic(), 0.1)
+                    response = await self._client.post(
+                        url,
+                        timeout=httpx.Timeout(remaining, connect=min(CONNECT_TIMEOUT_SECONDS, remaining)),
+                        **request_kwargs,
+                    )
+                finally:
+                    self._request_slots.release()
+                logger.debug("[%s] Response status: %s", name, response.status_code)
+
+                if response.status_code != 200 and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[%s] Error response body: %s", name, response.text)
 
                 response.raise_for_status()
-                result = response.json()
-                logger.info(f"[Whisper] Success - transcribed {len(result.get('text', ''))} chars")
-                return result
+        return response
+
+    async def _post_json(
+        self,
+        name: str,
+        url: str,
+        headers: Dict[str, str],
+        *,
+        json: Optional[dict] = None,
+        retry: bool = True,
+        **request_kwargs,
+    ) -> dict:
+        """POST a request (JSON body serialized with orjson) and return the parsed JSON response."""
+        if json is not None:
+            request_kwargs["content"] = orjson.dumps(json)
+        logger.debug("[%s] Sending request to %s", name, url)
+
+        try:
+            response = await self._post(name, url, headers=headers, retry=retry, **request_kwargs)
+            return orjson.loads(response.content)
         except httpx.TimeoutException as e:
-            logger.error(f"[Whisper] Timeout after 60s: {e}")
+            logger.error("[%s] Timeout: %s", name, e)
             raise
         except httpx.HTTPStatusError as e:
-            logger.error(f"[Whisper] HTTP error {e.response.status_code}: {e.response.text}")
+            logger.error("[%s] HTTP error %s", name, e.response.status_code)
             raise
         except Exception as e:
-            logger.error(f"[Whisper] Unexpected error: {type(e).__name__}: {e}")
+            logger.error("[%s] Unexpected error: %s: %s", name, type(e).__name__, e)
             raise
 
+    @staticmethod
+    def _audio_content_type(filename: str) -> str:
+        """Determine content type from filename."""
+        return _CONTENT_TYPES.get(filename.rsplit(".", 1)[-1].lower(), _DEFAULT_CONTENT_TYPE)
+
+    async def transcribe_audio_stream(
+        self,
+        stream: AsyncIterable[bytes],
+        size: int,
+        filename: str = "audio.m4a",
+        content_type: Optional[str] = None,
+        replayable: bool = False,
+    ) -> dict:
+        """
+        Transcribe audio piped from an async byte stream, without buffering it.
+
+        Args:
+            stream: Async iterable yielding the audio bytes
+            size: Total number of bytes the stream yields (used for Content-Length)
+            filename: Original filename for content-type detection
+            content_type: Audio MIME type (detected from filename if omitted)
+            replayable: True if iterating stream again yields the same bytes,
+                which allows failed requests to be retried
+
+        Returns:
+            dict with text, duration, language
+        """
+        content_type = content_type or self._audio_content_type(filename)
+        logger.debug("[Whisper] Streaming %d bytes, filename: %s, Content-Type: %s", size, filename, content_type)
+
+        boundary = secrets.token_hex(16)
+        safe_filename = filename.replace("\\", "\\\\").replace('"', "%22").replace("\r", "").replace("\n", "")
+        head = (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="model"\r\n\r\n'
+            "whisper-1\r\n"
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{safe_filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        return await self._send_whisper_request(
+            content=_MultipartAudioBody(head, stream, tail),
+            headers={
+                "Content-Type": f"multipart/form-data; boundary={boundary}",
+                "Content-Length": str(len(head) + size + len(tail)),
+            },
+            retry=replayable,
+        )
+
+    async def transcribe_audio_streaming(self, upload: UploadFile) -> dict:
+        """
+        Transcribe an uploaded audio file, streaming it to Whisper in fixed-size chunks.
+
+        Memory use is bounded by STREAM_CHUNK_BYTES regardless of recording length,
+        and failed requests can be retried since the upload is re-read from the start.
+
+        Returns:
+            dict with text, duration, language
+        """
+        size = upload.size
+        if size is None:
+            size = upload.file.seek(0, os.SEEK_END)
+
+        return await self.transcribe_audio_stream(
+            _UploadChunks(upload),
+            size,
+            filename=upload.filename or "audio.m4a",
+            replayable=True,
+        )
+
+    async def _send_whisper_request(
+        self, headers: Optional[Dict[str, str]] = None, retry: bool = True, **request_kwargs
+    ) -> dict:
+        """POST a transcription request to Whisper and return the parsed JSON."""
+        result = await self._post_json(
+            "Whisper",
+            self.whisper_url,
+            {**self._whisper_headers, **headers} if headers else self._whisper_headers,
+            retry=retry,
+            **request_kwargs,
+        )
+        logger.info("[Whisper] Success - transcribed %d chars", len(result.get("text", "")))
+        return result
+
     async def analyze_speech(
         self,
         transcription: str,
@@ -145,47 +522,8 @@ Coaching Style: NEUTRAL
         """
         voice_style_instruction = self._get_voice_style_instruction(voice_style)
 
-        system_prompt = f"""You are an expert presentation coach analyzing a practice presentation. Provide detailed, personalized coaching feedback that references specific moments from the transcription.
-
-{voice_style_instruction}
-
-Scoring Guidelines:
-- Tone Score (0-100): Overall vocal quality, appropriateness for context
-- Confidence Score (0-100): Assertiveness, clarity, conviction in speech
-- Enthusiasm Score (0-100): Energy, passion, engagement with topic
-- Clarity Score (0-100): Articulation, organization, ease of understanding
-
-Pacing Guidelines:
-- Ideal: 130-150 words per minute (clear, comfortable pace)
-- Acceptable: 100-130 or 150-180 WPM (slightly slow or fast)
-- Poor: Below 100 or above 180 WPM (too slow or rushed)
-
-Feedback Quality Guidelines:
-- Reference specific moments and quotes from the transcription
-- Balance strengths and growth areas with concrete examples
-- Provide actionable advice, not generic observations
-- Match your tone to the presentation's formality and topic
-- Use as much detail as needed to be genuinely helpful (2-8 sentences is fine)
-
-Example of excellent feedback:
-"Your opening about climate change showed strong conviction, especially when you emphasized the 2050 deadline at the start. Your pace was ideal (145 WPM) - fast enough to show energy but not rushed. The transition where you said 'but here's what we can do' was perfectly timed and confident. Consider varying your vocal tone more when transitioning between hard statistics and human impact stories to create more emotional contrast and keep your audience engaged. Your conclusion would also benefit from a slight pause before the final call-to-action to let the weight settle."
-
-Respond ONLY with valid JSON matching this exact structure (no additional text):
-{{
-  "toneScore": <number 0-100>,
-  "confidenceScore": <number 0-100>,
-  "enthusiasmScore": <number 0-100>,
-  "clarityScore": <number 0-100>,
-  "feedback": "<detailed, personalized coaching feedback>",
-  "keyStrengths": ["<specific strength with example>", "<specific strength with example>"],
-  "areasToImprove": ["<specific area with actionable advice>", "<specific area with actionable advice>"],
-  "toneStrength": "<specific strength about vocal tone with example from the speech>",
-  "toneImprovement": "<specific actionable improvement for vocal tone>",
-  "pacingStrength": "<specific strength about pacing/rhythm, reference the WPM if relevant>",
-  "pacingImprovement": "<specific actionable improvement for pacing>"
-}}"""
-
-        user_prompt = f"""Please analyze this presentation:
+        user_prompt = f"""Coaching style preference:{voice_style_instruction}
+Please analyze this presentation:
 
 TRANSCRIPTION:
 "{transcription}"
@@ -201,7 +539,7 @@ METRICS:
 Provide your analysis in JSON format as specified."""
 
         return await self._chat_completion(
-            system_prompt=system_prompt,
+            system_prompt=_SPEECH_SYSTEM_PROMPT,
             user_prompt=user_prompt,
             max_tokens=4000,
             json_response=True,
@@ -242,53 +580,29 @@ Provide your analysis in JSON format as specified."""
 
         voice_style_instruction = self._get_voice_style_instruction(voice_style)
 
-        system_prompt = f"""You are an expert presentation coach analyzing body language and non-verbal communication. Based on the gesture metrics and presentation content provided, evaluate the speaker's {", ".join(focus_areas)} and provide detailed, contextual coaching feedback.
-
-{voice_style_instruction}
-
-IMPORTANT: Only provide feedback about the metrics that were detected. Do not mention facial expressions if no facial data is available, do not mention posture if no posture data is available, and do not mention eye contact if no eye contact data is available.
-
-Feedback Quality Guidelines:
-- Connect body language observations to specific moments in the presentation
-- Reference the presentation content to make feedback contextual
-- Provide actionable advice with concrete examples
-- Match your tone to the presentation's formality and topic
-- Be specific and helpful, not generic (use as much detail as needed)
-
-Respond ONLY with valid JSON matching this exact structure (no additional text):
-{{
-  "gestureFeedback": "<detailed, contextual coaching feedback about detected body language>",
-  "gestureStrength": "<specific strength with example from the presentation>",
-  "gestureImprovement": "<specific improvement area with actionable advice>"
-}}"""
-
-        # Build metrics section
-        metrics_section = ""
+        # Build metrics section (blank line between blocks, trailing newline)
+        parts = []
         if has_facial:
-            metrics_section += f"""FACIAL EXPRESSION METRICS:
-- Smile frequency: {smile_frequency * 100:.1f}%
-- Expression variety: {expression_variety * 100:.1f}%
-- Engagement level: {engagement_level * 100:.1f}%
-
-"""
+            parts.append(_FACIAL_TMPL.format(
+                smile_frequency * 100, expression_variety * 100, engagement_level * 100
+            ))
         if has_posture:
-            metrics_section += f"""BODY POSTURE METRICS:
-- Posture confidence: {confidence_score * 100:.1f}%
-- Movement consistency: {movement_consistency * 100:.1f}%
-- Stability: {stability_score * 100:.1f}%
-
-"""
+            parts.append(_POSTURE_TMPL.format(
+                confidence_score * 100, movement_consistency * 100, stability_score * 100
+            ))
         if has_eye_contact:
-            metrics_section += f"""EYE CONTACT METRICS:
-- Camera focus: {camera_focus_percentage * 100:.1f}%
-- Time reading notes (looking down): {reading_notes_percentage * 100:.1f}%
-- Gaze stability: {gaze_stability_score * 100:.1f}%
-
-"""
+            parts.append(_EYE_CONTACT_TMPL.format(
+                camera_focus_percentage * 100, reading_notes_percentage * 100, gaze_stability_score * 100
+            ))
             if reading_notes_percentage > 0.15:
-                metrics_section += "NOTE: The speaker frequently looked down, likely reading notes. Address this in the feedback.\n"
+                parts.append(_READING_NOTES_NOTE)
+        parts.append("")
+        metrics_section = "\n".join(parts)
 
-        user_prompt = f"""Please analyze this speaker's body language:
+        user_prompt = f"""Coaching style preference:{voice_style_instruction}
+Detected signals: {", ".join(focus_areas)}
+
+Please analyze this speaker's body language:
 
 {metrics_section}
 FULL PRESENTATION TRANSCRIPTION:
@@ -297,7 +611,7 @@ FULL PRESENTATION TRANSCRIPTION:
 Provide your gesture analysis in JSON format as specified. Reference specific moments from the transcription to make your feedback contextual and helpful. Only comment on the metrics that were actually detected."""
 
         return await self._chat_completion(
-            system_prompt=system_prompt,
+            system_prompt=_GESTURE_SYSTEM_PROMPT,
             user_prompt=user_prompt,
             max_tokens=4000,
             json_response=True,
@@ -305,11 +619,12 @@ Provide your gesture analysis in JSON format as specified. Reference specific mo
 
     async def annotate_key_frame(
         self,
-        image_base64: str,
+        image_base64: Optional[str],
         frame_type: str,
         transcription_excerpt: str,
         timestamp: float,
         voice_style: str = "Neutral",
+        image_bytes: Optional[bytes] = None,
     ) -> str:
         """
         Generate key frame annotation using GPT Vision.
@@ -320,35 +635,23 @@ Provide your gesture analysis in JSON format as specified. Reference specific mo
             transcription_excerpt: Transcription context around this timestamp
             timestamp: Timestamp in seconds
             voice_style: Coaching style (Neutral, Motivational, Analytical)
+            image_bytes: Raw JPEG bytes, used instead of image_base64 when given
 
         Returns:
             Annotation text (20-40 words)
         """
-        voice_style_instruction = self._get_voice_style_instruction(voice_style)
+        if image_bytes is not None:
+            image_base64 = base64.b64encode(image_bytes).decode("ascii")
+        elif image_base64 is None:
+            raise ValueError("Either image_base64 or image_bytes is required")
 
-        system_prompt = f"""You are an expert presentation coach analyzing a specific moment from a presentation. Based on the frame image and transcription context, provide one concise, specific coaching comment (20-40 words).
-
-{voice_style_instruction}
-
-Guidelines:
-- Adapt tone to presentation formality (academic = professional, casual = friendly)
-- Reference specific visual details (posture, expression, gaze)
-- Connect to transcription context when relevant
-- Be specific and actionable, not generic
-- For "best" frames: highlight what's working well
-- For "improve" frames: suggest specific improvements"""
+        voice_style_instruction = self._get_voice_style_instruction(voice_style)
 
         # Build type-specific guidance
-        type_guidance = {
-            "bestFacial": "This is a STRENGTH moment for facial expression. Highlight what's working well (eye contact, smile, engagement, etc.).",
-            "bestOverall": "This is a STRENGTH moment overall. Highlight the combination of good expression, posture, and engagement.",
-            "improveFacial": "This is an IMPROVEMENT AREA for facial expression. Suggest specific ways to improve engagement, eye contact, or expressiveness.",
-            "improvePosture": "This is an IMPROVEMENT AREA for posture. Suggest specific ways to improve body position, confidence, or stability.",
-            "improveEyeContact": "This is an IMPROVEMENT AREA for eye contact. Suggest ways to improve camera focus or gaze consistency.",
-            "averageMoment": "This is a REPRESENTATIVE moment. Provide neutral, balanced observation.",
-        }.get(frame_type, "Provide a balanced observation.")
-
-        user_prompt = f"""Frame type: {frame_type}
+        type_guidance = _FRAME_TYPE_GUIDANCE.get(frame_type, _DEFAULT_FRAME_GUIDANCE)
+
+        user_prompt = f"""Coaching style preference:{voice_style_instruction}
+Frame type: {frame_type}
 Timestamp: {timestamp:.1f}s
 
 {type_guidance}
@@ -359,7 +662,7 @@ Transcription context:
 Analyze this presentation frame and provide ONE concise coaching comment (20-40 words). Return ONLY the annotation text, no JSON, no additional formatting."""
 
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": _VISION_SYSTEM_PROMPT},
             {
                 "role": "user",
                 "content": [
@@ -372,9 +675,7 @@ Analyze this presentation frame and provide ONE concise coaching comment (20-40
             },
         ]
 
-        url = self._gpt_url()
-        logger.info(f"[Vision] Request URL: {url}")
-        logger.info(f"[Vision] Frame type: {frame_type}, timestamp: {timestamp:.1f}s, image: {len(image_base64)} chars base64")
+        logger.debug("[Vision] Frame type: %s, timestamp: %.1fs, image: %d chars base64", frame_type, timestamp, len(image_base64))
 
         request_body = {
             "messages": messages,
@@ -382,39 +683,75 @@ Analyze this presentation frame and provide ONE concise coaching comment (20-40
             "temperature": 1.0,
         }
 
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                logger.info(f"[Vision] Sending request...")
-                response = await client.post(
-                    url,
-                    headers={
-                        "api-key": self.gpt_api_key,
-                        "Content-Type": "application/json",
-                    },
-                    json=request_body,
-                )
-                logger.info(f"[Vision] Response status: {response.status_code}")
+        data = await self._post_json(
+            "Vision",
+            self.gpt_url,
+            self._gpt_headers,
+            json=request_body,
+            timeout=30.0,
+        )
 
-                if response.status_code != 200:
-                    logger.error(f"[Vision] Error response body: {response.text}")
+        # Extract annotation from response
+        annotation = data["choices"][0]["message"]["content"]
+        logger.info("[Vision] Success - %s annotation, %d chars", frame_type, len(annotation))
+        # Clean up annotation
+        return annotation.strip().replace('"', "")
 
-                response.raise_for_status()
-                data = response.json()
+    async def annotate_key_frames_batch(
+        self,
+        frames: List[Dict],
+        voice_style: str = "Neutral",
+    ) -> List[str]:
+        """
+        Annotate several key frames with a single GPT Vision request.
 
-            # Extract annotation from response
-            annotation = data["choices"][0]["message"]["content"]
-            logger.info(f"[Vision] Success - annotation: {annotation[:50]}...")
-            # Clean up annotation
-            return annotation.strip().replace('"', "")
-        except httpx.TimeoutException as e:
-            logger.error(f"[Vision] Timeout after 30s: {e}")
-            raise
-        except httpx.HTTPStatusError as e:
-            logger.error(f"[Vision] HTTP error {e.response.status_code}: {e.response.text}")
-            raise
-        except Exception as e:
-            logger.error(f"[Vision] Unexpected error: {type(e).__name__}: {e}")
-            raise
+        Args:
+            frames: List of dicts with image_base64, frame_type,
+                transcription_excerpt and timestamp (same as annotate_key_frame)
+            voice_style: Coaching style (Neutral, Motivational, Analytical)
+
+        Returns:
+            Annotation texts (20-40 words each), in the same order as frames
+        """
+        voice_style_instruction = self._get_voice_style_instruction(voice_style)
+
+        frame_sections = []
+        for index, frame in enumerate(frames, start=1):
+            type_guidance = _FRAME_TYPE_GUIDANCE.get(frame["frame_type"], _DEFAULT_FRAME_GUIDANCE)
+            frame_sections.append(f"""frame_{index} (image {index}):
+Frame type: {frame["frame_type"]}
+Timestamp: {frame["timestamp"]:.1f}s
+{type_guidance}
+Transcription context:
+"{frame["transcription_excerpt"]}"
+""")
+        frames_text = "\n".join(frame_sections)
+        frame_ids = ", ".join(f'"frame_{index}": "<annotation>"' for index in range(1, len(frames) + 1))
+
+        user_prompt = f"""Coaching style preference:{voice_style_instruction}
+The {len(frames)} images below are presentation frames, in this order:
+
+{frames_text}
+For EACH frame, provide ONE concise coaching comment (20-40 words).
+Respond ONLY with valid JSON matching this exact structure (no additional text):
+{{{frame_ids}}}"""
+
+        logger.debug("[Vision] Batch of %d frames", len(frames))
+        result = await self._chat_completion(
+            system_prompt=_VISION_BATCH_SYSTEM_PROMPT,
+            user_prompt=user_prompt,
+            max_tokens=4000,
+            json_response=True,
+            images_base64=[frame["image_base64"] for frame in frames],
+        )
+
+        annotations = []
+        for index in range(1, len(frames) + 1):
+            annotation = result.get(f"frame_{index}")
+            if not isinstance(annotation, str) or not annotation.strip():
+                raise ValueError(f"GPT returned no annotation for frame_{index}")
+            annotations.append(annotation.strip().replace('"', ""))
+        return annotations
 
     async def _chat_completion(
         self,
@@ -422,16 +759,22 @@ Analyze this presentation frame and provide ONE concise coaching comment (20-40
         user_prompt: str,
         max_tokens: int = 2000,
         json_response: bool = False,
+        images_base64: Optional[List[str]] = None,
     ) -> dict:
-        """Internal helper for GPT chat completions."""
-        url = self._gpt_url()
-        logger.info(f"[GPT] Request URL: {url}")
-        logger.info(f"[GPT] Prompt length: {len(user_prompt)} chars, max_tokens: {max_tokens}")
+        """Internal helper for GPT chat completions. Optional JPEG images are appended to the user message."""
+        logger.debug("[GPT] Prompt length: %d chars, max_tokens: %d", len(user_prompt), max_tokens)
+
+        user_content = user_prompt
+        if images_base64:
+            user_content = [{"type": "text", "text": user_prompt}] + [
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
+                for image_base64 in images_base64
+            ]
 
         request_body = {
             "messages": [
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
+                {"role": "user", "content": user_content},
             ],
             "max_completion_tokens": max_tokens,
             "temperature": 1.0,
@@ -440,50 +783,28 @@ Analyze this presentation frame and provide ONE concise coaching comment (20-40
         # NOTE: response_format: json_object removed - GPT-5 returns empty responses with it.
         # JSON output is already enforced via "Respond ONLY with valid JSON" in prompts.
 
-        try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                logger.info(f"[GPT] Sending request...")
-                response = await client.post(
-                    url,
-                    headers={
-                        "api-key": self.gpt_api_key,
-                        "Content-Type": "application/json",
-                    },
-                    json=request_body,
-                )
-                logger.info(f"[GPT] Response status: {response.status_code}")
-
-                if response.status_code != 200:
-                    logger.error(f"[GPT] Error response body: {response.text}")
-
-                response.raise_for_status()
-                data = response.json()
+        data = await self._post_json(
+            "GPT",
+            self.gpt_url,
+            self._gpt_headers,
+            json=request_body,
+        )
 
-            # Parse the content from the response
-            content = data["choices"][0]["message"]["content"]
+        # Parse the content from the response
+        content = data["choices"][0]["message"]["content"]
 
-            # Handle empty responses (safety net)
-            if not content:
-                finish_reason = data["choices"][0].get("finish_reason", "unknown")
-                logger.error(f"[GPT] Empty response received (finish_reason: {finish_reason})")
-                raise ValueError(f"GPT returned empty response (finish_reason: {finish_reason})")
+        # Handle empty responses (safety net)
+        if not content:
+            finish_reason = data["choices"][0].get("finish_reason", "unknown")
+            logger.error("[GPT] Empty response received (finish_reason: %s)", finish_reason)
+            raise ValueError(f"GPT returned empty response (finish_reason: {finish_reason})")
 
-            logger.info(f"[GPT] Success - response {len(content)} chars")
+        logger.info("[GPT] Success - response %d chars (max_tokens: %d)", len(content), max_tokens)
 
-            if json_response:
-                import json
-                try:
-                    return json.loads(content)
-                except json.JSONDecodeError as e:
-                    logger.error(f"[GPT] Invalid JSON response: {e}")
-                    raise ValueError(f"GPT returned invalid JSON: {str(e)}")
-            return {"content": content}
-        except httpx.TimeoutException as e:
-            logger.error(f"[GPT] Timeout after 60s: {e}")
-            raise
-        except httpx.HTTPStatusError as e:
-            logger.error(f"[GPT] HTTP error {e.response.status_code}: {e.response.text}")
-            raise
-        except Exception as e:
-            logger.error(f"[GPT] Unexpected error: {type(e).__name__}: {e}")
-            raise
+        if json_response:
+            try:
+                return _parse_json_reply(content)
+            except orjson.JSONDecodeError as e:
+                logger.error("[GPT] Invalid JSON response: %s", e)
+                raise ValueError(f"GPT returned invalid JSON: {str(e)}")
+        return {"content": content}
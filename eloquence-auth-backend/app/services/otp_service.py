@@ -1,14 +1,18 @@
 import secrets
-import string
-from datetime import datetime, timedelta
-from typing import Optional
-from app.config import settings
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Union
+from app.config import get_settings
 
 class OTPService:
+    # otp_length is fixed for the process; precompute the range and format spec
+    _OTP_RANGE = 10 ** get_settings().otp_length
+    _OTP_FORMAT = f"0{get_settings().otp_length}d"
+
     @staticmethod
     def generate_otp() -> str:
         """Generate a secure random 6-digit OTP code."""
-        return ''.join(secrets.choice(string.digits) for _ in range(settings.otp_length))
+        return format(secrets.randbelow(OTPService._OTP_RANGE), OTPService._OTP_FORMAT)
 
     @staticmethod
     def generate_session_token() -> str:
@@ -18,22 +22,18 @@ class OTPService:
     @staticmethod
     def calculate_expiry() -> datetime:
         """Calculate OTP expiry time."""
-        return datetime.utcnow() + timedelta(minutes=settings.otp_expiry_minutes)
+        return datetime.now(timezone.utc) + timedelta(minutes=get_settings().otp_expiry_minutes)
 
     @staticmethod
     def calculate_session_expiry() -> datetime:
         """Calculate session expiry time."""
-        return datetime.utcnow() + timedelta(days=settings.session_expiry_days)
-
-    @staticmethod
-    def is_expired(expiry_time: datetime) -> bool:
-        """Check if a timestamp has expired."""
-        return datetime.utcnow() > expiry_time
+        return datetime.now(timezone.utc) + timedelta(days=get_settings().session_expiry_days)
 
     @staticmethod
-    def is_rate_limited(last_request_time: Optional[datetime]) -> bool:
-        """Check if email is rate limited."""
-        if not last_request_time:
-            return False
-        time_since_last = datetime.utcnow() - last_request_time
-        return time_since_last.total_seconds() < (settings.otp_rate_limit_minutes * 60)
+    def is_expired(expiry_time: Union[int, datetime]) -> bool:
+        """Check if an expiry (epoch seconds or datetime; naive values are UTC) has passed."""
+        if isinstance(expiry_time, int):
+            return time.time() > expiry_time
+        if expiry_time.tzinfo is None:
+            expiry_time = expiry_time.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) > expiry_time
@@ -1,16 +1,66 @@
-from azure.data.tables import TableServiceClient, TableEntity
+from azure.data.tables import TableServiceClient, TableEntity, TableTransactionError
 from azure.core.exceptions import ResourceNotFoundError
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any
+import time
 import uuid
-from app.config import settings
+from app.config import get_settings
+
+# Azure Tables limit for operations in one entity group transaction
+MAX_TRANSACTION_OPERATIONS = 100
+
+# OData filter templates; values are always bound via parameters (the SDK escapes them)
+_UNUSED_OTPS_FILTER = "PartitionKey eq @pk and isUsed eq false"
+_LIVE_OTPS_FILTER = "PartitionKey eq @pk and isUsed eq false and expiresAtEpoch gt @now"
+_OTHER_OTPS_FILTER = "PartitionKey eq @pk and RowKey ne @keep"
+_LEGACY_SESSION_FILTER = "RowKey eq @token"
+_LEGACY_SESSIONS_FILTER = "PartitionKey ne @pk"
+
+# All sessions share one partition so a token lookup is a point read
+SESSION_PARTITION_KEY = "session"
+
+# Characters not allowed in RowKeys, percent-encoded ("%" too, to keep keys unique)
+_ROW_KEY_TRANSLATION = str.maketrans({"%": "%25", "/": "%2F", "\\": "%5C", "#": "%23", "?": "%3F"})
+
+def _inverted_tick_row_key() -> str:
+    """RowKey that sorts newest-first (Azure Tables returns rows in RowKey order)."""
+    return f"{(2**63 - int(time.time() * 1000)):019d}_{uuid.uuid4().hex}"
+
+def _session_row_key(token: str) -> str:
+    """RowKey for a session token (token_urlsafe output passes through unchanged)."""
+    return token.translate(_ROW_KEY_TRANSLATION)
+
+def _to_epoch(value: datetime) -> int:
+    """Convert a UTC datetime to Unix epoch seconds (naive values are treated as UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
 
 class StorageService:
+    # Emails are expected pre-lowercased (see EmailAddress in app.models);
+    # they are used as-is for PartitionKey.
+
+    # Tables only need creating once per process, not per instance
+    _tables_ensured = False
+
     def __init__(self):
+        settings = get_settings()
         self.service_client = TableServiceClient.from_connection_string(
             settings.azure_storage_connection_string
         )
-        self._ensure_tables_exist()
+        if not StorageService._tables_ensured:
+            self._ensure_tables_exist()
+            StorageService._tables_ensured = True
+
+        # Table clients are reused for every operation
+        self._otp_table = self.service_client.get_table_client("otpcodes")
+        self._sessions_table = self.service_client.get_table_client("usersessions")
+
+    def close(self):
+        """Close table clients and the service client."""
+        self._otp_table.close()
+        self._sessions_table.close()
+        self.service_client.close()
 
     def _ensure_tables_exist(self):
         """Create tables if they don't exist."""
@@ -24,18 +74,33 @@ class StorageService:
         except Exception:
             pass  # Table already exists
 
+    @staticmethod
+    def get_expiry_epoch(entity: Dict[str, Any]) -> int:
+        """Return an entity's expiry as epoch seconds (parses ISO for rows written before expiresAtEpoch)."""
+        expires_at_epoch = entity.get("expiresAtEpoch")
+        if expires_at_epoch is not None:
+            return int(expires_at_epoch)
+        return _to_epoch(datetime.fromisoformat(entity.get("expiresAt")))
+
+    @staticmethod
+    def get_created_epoch(entity: Dict[str, Any]) -> int:
+        """Return an entity's createdAt as epoch seconds."""
+        return _to_epoch(datetime.fromisoformat(entity.get("createdAt")))
+
     # OTP Operations
     def save_otp(self, email: str, code: str, expires_at: datetime) -> str:
         """Save OTP code to storage. Returns the row key."""
-        table_client = self.service_client.get_table_client("otpcodes")
-        row_key = str(uuid.uuid4())
+        table_client = self._otp_table
+        row_key = _inverted_tick_row_key()
 
         entity = {
-            "PartitionKey": email.lower(),
+            "PartitionKey": email,
             "RowKey": row_key,
             "code": code,
-            "createdAt": datetime.utcnow().isoformat(),
+            "codeInt": int(code),
+            "createdAt": datetime.now(timezone.utc).isoformat(),
             "expiresAt": expires_at.isoformat(),
+            "expiresAtEpoch": _to_epoch(expires_at),
             "attempts": 0,
             "isUsed": False
         }
@@ -44,20 +109,27 @@ class StorageService:
         return row_key
 
     def get_latest_otp(self, email: str) -> Optional[Dict[str, Any]]:
-        """Get the most recent OTP for an email."""
-        table_client = self.service_client.get_table_client("otpcodes")
+        """Get the most recent unused, unexpired OTP for an email."""
+        table_client = self._otp_table
 
         try:
-            # Query for this email's OTPs, ordered by creation time
-            query_filter = f"PartitionKey eq '{email.lower()}' and isUsed eq false"
-            entities = list(table_client.query_entities(query_filter))
-
-            if not entities:
-                return None
-
-            # Sort by createdAt descending and return the most recent
-            entities.sort(key=lambda x: x.get('createdAt', ''), reverse=True)
-            return entities[0]
+            if get_settings().otp_legacy_row_key_scan:
+                # Rows saved with random uuid RowKeys (and possibly no expiresAtEpoch):
+                # scan and sort by createdAt, expiry is checked by the caller
+                entities = list(table_client.query_entities(_UNUSED_OTPS_FILTER, parameters={"pk": email}))
+                if not entities:
+                    return None
+                entities.sort(key=lambda x: x.get('createdAt', ''), reverse=True)
+                return entities[0]
+
+            # Expired rows are filtered server-side; RowKeys are inverted
+            # timestamps, so the first row is the newest
+            entities = table_client.query_entities(
+                _LIVE_OTPS_FILTER,
+                parameters={"pk": email, "now": int(time.time())},
+                results_per_page=1,
+            )
+            return next(iter(entities), None)
 
         except Exception as e:
             print(f"Error retrieving OTP: {e}")
@@ -65,10 +137,10 @@ class StorageService:
 
     def increment_otp_attempts(self, email: str, row_key: str) -> int:
         """Increment OTP attempt counter. Returns new attempt count."""
-        table_client = self.service_client.get_table_client("otpcodes")
+        table_client = self._otp_table
 
         try:
-            entity = table_client.get_entity(email.lower(), row_key)
+            entity = table_client.get_entity(email, row_key)
             entity['attempts'] = entity.get('attempts', 0) + 1
             table_client.update_entity(entity, mode="merge")
             return entity['attempts']
@@ -78,12 +150,12 @@ class StorageService:
 
     def mark_otp_used(self, email: str, row_key: str):
         """Mark OTP as used."""
-        table_client = self.service_client.get_table_client("otpcodes")
+        table_client = self._otp_table
 
         try:
-            entity = table_client.get_entity(email.lower(), row_key)
+            entity = table_client.get_entity(email, row_key)
             entity['isUsed'] = True
-            entity['usedAt'] = datetime.utcnow().isoformat()
+            entity['usedAt'] = datetime.now(timezone.utc).isoformat()
             table_client.update_entity(entity, mode="merge")
         except Exception as e:
             print(f"Error marking OTP as used: {e}")
@@ -91,17 +163,19 @@ class StorageService:
     # Session Operations
     def create_session(self, email: str, token: str, expires_at: datetime) -> Dict[str, Any]:
         """Create a new user session."""
-        table_client = self.service_client.get_table_client("usersessions")
+        table_client = self._sessions_table
 
         user_id = str(uuid.uuid4())  # Generate new user ID
-        now = datetime.utcnow().isoformat()
+        now = datetime.now(timezone.utc).isoformat()
 
         entity = {
-            "PartitionKey": email.lower(),
-            "RowKey": token,
+            "PartitionKey": SESSION_PARTITION_KEY,
+            "RowKey": _session_row_key(token),
+            "email": email,
             "userId": user_id,
             "createdAt": now,
             "expiresAt": expires_at.isoformat(),
+            "expiresAtEpoch": _to_epoch(expires_at),
             "lastAccessedAt": now
         }
 
@@ -109,31 +183,67 @@ class StorageService:
         return entity
 
     def get_session(self, token: str) -> Optional[Dict[str, Any]]:
-        """Retrieve a session by token."""
-        table_client = self.service_client.get_table_client("usersessions")
+        """Retrieve a session by token. The returned entity always has an "email" field."""
+        table_client = self._sessions_table
 
         try:
-            # Query across all partitions for this token
-            query_filter = f"RowKey eq '{token}'"
-            entities = list(table_client.query_entities(query_filter))
+            return table_client.get_entity(SESSION_PARTITION_KEY, _session_row_key(token))
+        except ResourceNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error retrieving session: {e}")
+            return None
 
-            if not entities:
-                return None
+        if not get_settings().session_legacy_lookup:
+            return None
 
-            return entities[0]
+        try:
+            # Legacy rows are partitioned by email: query across all partitions
+            entities = table_client.query_entities(_LEGACY_SESSION_FILTER, parameters={"token": token})
+            entity = next(iter(entities), None)
+            if entity is not None:
+                entity.setdefault("email", entity["PartitionKey"])
+            return entity
         except Exception as e:
             print(f"Error retrieving session: {e}")
             return None
 
-    def delete_old_otps(self, email: str):
-        """Delete old OTPs for an email (cleanup)."""
-        table_client = self.service_client.get_table_client("otpcodes")
+    def migrate_legacy_sessions(self) -> int:
+        """Move sessions stored under email partitions into the session partition. Returns the count moved."""
+        table_client = self._sessions_table
+        moved = 0
 
-        try:
-            query_filter = f"PartitionKey eq '{email.lower()}'"
-            entities = list(table_client.query_entities(query_filter))
+        for entity in table_client.query_entities(_LEGACY_SESSIONS_FILTER, parameters={"pk": SESSION_PARTITION_KEY}):
+            migrated = dict(entity)
+            migrated["email"] = entity["PartitionKey"]
+            migrated["PartitionKey"] = SESSION_PARTITION_KEY
+            migrated["RowKey"] = _session_row_key(entity["RowKey"])
+            table_client.upsert_entity(migrated)
+            table_client.delete_entity(entity["PartitionKey"], entity["RowKey"])
+            moved += 1
 
-            for entity in entities:
-                table_client.delete_entity(entity['PartitionKey'], entity['RowKey'])
+        return moved
+
+    def delete_old_otps(self, email: str, keep_row_key: Optional[str] = None):
+        """Delete old OTPs for an email (cleanup), except keep_row_key."""
+        table_client = self._otp_table
+
+        try:
+            entities = table_client.query_entities(
+                _OTHER_OTPS_FILTER,
+                parameters={"pk": email, "keep": keep_row_key or ""},
+                select=["PartitionKey", "RowKey"],
+            )
+            operations = [
+                ("delete", {"PartitionKey": entity['PartitionKey'], "RowKey": entity['RowKey']})
+                for entity in entities
+            ]
+
+            # Same partition, so deletes can be batched into transactions
+            for start in range(0, len(operations), MAX_TRANSACTION_OPERATIONS):
+                try:
+                    table_client.submit_transaction(operations[start:start + MAX_TRANSACTION_OPERATIONS])
+                except TableTransactionError as e:
+                    print(f"Error deleting old OTPs batch: {e}")
         except Exception as e:
             print(f"Error deleting old OTPs: {e}")